@@ -0,0 +1,83 @@
+"""Ahead-of-time build for the planner's numeric kernels.
+
+Run once at install time:
+
+    python build_kernels.py
+
+This produces a `_planner_kernels` extension module (via numba.pycc)
+that study_planner imports when present, so no JIT warm-up is paid on
+the first `plan` command. The module is optional: study_planner falls
+back to its Python implementations when the build has not been run.
+"""
+import numpy as np
+from numba.pycc import CC
+
+cc = CC("_planner_kernels")
+
+
+@cc.export("distribute_time", "i8[:](i8, f8[:], i8)")
+def distribute_time(total_minutes, weights, min_block):
+    n = weights.shape[0]
+    s = weights.sum()
+    if s > 0:
+        weights = weights / s
+    exact = total_minutes * weights
+    floors = np.empty(n, dtype=np.int64)
+    for i in range(n):
+        floors[i] = np.int64(np.floor(exact[i]))
+    # clamp the residual: compiled code is not bounds-checked, and
+    # unnormalized weights could push diff past n
+    diff = min(total_minutes - floors.sum(), n)
+    if diff > 0:
+        order = np.argsort(floors - exact, kind="mergesort")
+        for i in range(diff):
+            floors[order[i]] += 1
+    if total_minutes >= min_block:
+        for i in range(n):
+            if floors[i] == 0:
+                floors[i] = min_block
+        # pull the floor-induced overshoot back out of the largest
+        # allocations so the minute budget is preserved
+        excess = floors.sum() - total_minutes
+        if excess > 0:
+            order = np.argsort(-floors, kind="mergesort")
+            for j in range(n):
+                if excess <= 0:
+                    break
+                i = order[j]
+                take = min(excess, floors[i] - min_block)
+                if take > 0:
+                    floors[i] -= take
+                    excess -= take
+    return floors
+
+
+@cc.export("split_sessions", "i8[:,:](i8, i8, i8)")
+def split_sessions(minutes, focus_len, short_break):
+    # (duration, kind) rows; kind 0 = study, 1 = break
+    cap = 2 * (minutes // focus_len + 1)
+    buf = np.empty((cap, 2), dtype=np.int64)
+    n = 0
+    remaining = minutes
+    while remaining > 0:
+        if remaining <= focus_len:
+            buf[n, 0] = remaining
+            buf[n, 1] = 0
+            n += 1
+            remaining = 0
+        else:
+            buf[n, 0] = focus_len
+            buf[n, 1] = 0
+            n += 1
+            remaining -= focus_len
+            if remaining > 0:
+                b = min(short_break, remaining)
+                buf[n, 0] = b
+                buf[n, 1] = 1
+                n += 1
+                remaining -= b
+    return buf[:n]
+
+
+if __name__ == "__main__":
+    cc.compile()
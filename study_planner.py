@@ -1,15 +1,25 @@
 import re
 import json
+import math
 import random
-from datetime import datetime, timedelta
+from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Tuple
 
-import numpy as np
-import pandas as pd
 import chainlit as cl
 
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder works everywhere
+    orjson = None
+
+try:
+    import _planner_kernels  # AOT-compiled by build_kernels.py
+except ImportError:
+    _planner_kernels = None
+
 MEMORY_PATH = Path("planner_memory.json")
+_PAIR_RE = re.compile(r"\s*([^\s,:][^,:]*?)\s*(?::\s*([^,]*?))?\s*(?:,|$)")
 QUOTES = [
     "Focus on the next small win.",
     "Consistency beats intensity.",
@@ -17,59 +27,96 @@ QUOTES = [
     "Done is better than perfect.",
     "Tiny progress compounds."
 ]
+_RNG = random.Random()
+_QUOTE_N = len(QUOTES)
+
+_MEM_CACHE = None
+_MEM_MTIME = 0.0
 
 def load_memory():
-    if MEMORY_PATH.exists():
-        try:
-            return json.loads(MEMORY_PATH.read_text(encoding="utf-8"))
-        except Exception:
-            pass
+    global _MEM_CACHE, _MEM_MTIME
+    try:
+        mtime = MEMORY_PATH.stat().st_mtime
+    except OSError:
+        return {"last_plan": []}
+    if _MEM_CACHE is not None and mtime == _MEM_MTIME:
+        return _MEM_CACHE
+    try:
+        data = MEMORY_PATH.read_bytes()
+        _MEM_CACHE = orjson.loads(data) if orjson else json.loads(data)
+        _MEM_MTIME = mtime
+        return _MEM_CACHE
+    except Exception:
+        pass
     return {"last_plan": []}
 
 def save_memory(mem: dict):
-    MEMORY_PATH.write_text(json.dumps(mem, ensure_ascii=False, indent=2), encoding="utf-8")
+    global _MEM_CACHE, _MEM_MTIME
+    if orjson:
+        payload = orjson.dumps(mem)
+    else:
+        payload = json.dumps(mem, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    with open(MEMORY_PATH, "wb", buffering=64 * 1024) as f:
+        f.write(payload)
+    _MEM_CACHE = mem
+    _MEM_MTIME = MEMORY_PATH.stat().st_mtime
 
-def save_last_plan(df: pd.DataFrame):
-    mem = load_memory()
-    mem["last_plan"] = df.to_dict(orient="records")
+def save_last_plan(rows: List[dict]):
+    mem = _MEM_CACHE if _MEM_CACHE is not None else load_memory()
+    mem["last_plan"] = rows
     save_memory(mem)
 
-def load_last_plan() -> pd.DataFrame:
+def load_last_plan() -> List[dict]:
     mem = load_memory()
-    if mem.get("last_plan"):
-        return pd.DataFrame(mem["last_plan"])
-    return pd.DataFrame()
+    return mem.get("last_plan") or []
+
+def as_dataframe(rows: List[dict]):
+    import pandas as pd
+    return pd.DataFrame(rows)
 
 def normalize_weights(priorities: Dict[str, float]) -> Dict[str, float]:
-    arr = np.array(list(priorities.values()), dtype=float)
-    if arr.sum() == 0:
+    s = math.fsum(priorities.values())
+    if s == 0:
         return {k: 1.0/len(priorities) for k in priorities}
-    arr = arr / arr.sum()
-    return {k: float(v) for k, v in zip(priorities.keys(), arr)}
+    inv = 1.0 / s
+    return {k: v * inv for k, v in priorities.items()}
 
 def distribute_time(total_minutes: int, weights: Dict[str, float], min_block: int = 25) -> Dict[str, int]:
     if total_minutes <= 0:
         return {k: 0 for k in weights}
-    raw = {k: int(total_minutes * w) for k, w in weights.items()}
-    for k in raw:
-        if raw[k] == 0 and total_minutes >= min_block:
-            raw[k] = min_block
-    diff = total_minutes - sum(raw.values())
-    keys = list(weights.keys())
-    i = 0
-    while diff != 0 and keys:
-        k = keys[i % len(keys)]
-        if diff > 0:
-            raw[k] += 1
-            diff -= 1
-        else:
-            if raw[k] > min_block:
-                raw[k] -= 1
-                diff += 1
-        i += 1
-    return raw
+    import numpy as np
+    w = np.fromiter(weights.values(), dtype=float)
+    if _planner_kernels is not None:
+        alloc = _planner_kernels.distribute_time(total_minutes, w, min_block)
+        return dict(zip(weights.keys(), alloc.tolist()))
+    s = w.sum()
+    if s > 0:
+        w = w / s
+    exact = total_minutes * w
+    floors = np.floor(exact).astype(np.int64)
+    diff = min(total_minutes - int(floors.sum()), len(floors))
+    if diff > 0:
+        order = np.argsort(floors - exact, kind="mergesort")
+        floors[order[:diff]] += 1
+    if total_minutes >= min_block:
+        floors[floors == 0] = min_block
+        # pull the floor-induced overshoot back out of the largest
+        # allocations so the user's minute budget is preserved
+        excess = int(floors.sum()) - total_minutes
+        if excess > 0:
+            for i in np.argsort(-floors, kind="mergesort"):
+                if excess <= 0:
+                    break
+                take = min(excess, int(floors[i]) - min_block)
+                if take > 0:
+                    floors[i] -= take
+                    excess -= take
+    return dict(zip(weights.keys(), floors.tolist()))
 
 def split_into_sessions(minutes: int, focus_len: int = 50, short_break: int = 10) -> List[Tuple[int, str]]:
+    if _planner_kernels is not None:
+        kinds = ('study', 'break')
+        return [(int(d), kinds[k]) for d, k in _planner_kernels.split_sessions(minutes, focus_len, short_break)]
     plan = []
     remaining = minutes
     while remaining > 0:
@@ -92,41 +139,53 @@ def build_schedule(subjects: List[str],
                    focus_len: int = 45,
                    short_break: int = 10,
                    long_break_every: int = 3,
-                   long_break_len: int = 20) -> pd.DataFrame:
+                   long_break_len: int = 20) -> List[dict]:
+    import numpy as np
     start_time = start_time or datetime.now().replace(second=0, microsecond=0)
     weights = normalize_weights(priorities)
     per_subject = distribute_time(total_minutes, weights, min_block=min(25, total_minutes))
-    rows = []
-    cur = start_time
+    # columns: start_min, end_min, duration, kind (0 = study, 1 = break), subject index
+    max_rows = sum(2 * c + c // long_break_every + 1
+                   for c in (-(-per_subject[s] // focus_len) for s in subjects)
+                   if c > 0)
+    buf = np.empty((max_rows, 5), dtype=np.int32)
+    n = 0
+    cur_min = start_time.hour * 60 + start_time.minute
     study_block_counter = 0
-    for subj in subjects:
-        sessions = split_into_sessions(per_subject[subj], focus_len, short_break)
-        for dur, kind in sessions:
-            end = cur + timedelta(minutes=dur)
-            rows.append({
-                "start": cur.strftime("%H:%M"),
-                "end": end.strftime("%H:%M"),
-                "duration_min": dur,
-                "type": kind,
-                "subject": subj if kind == 'study' else ""
-            })
-            cur = end
-            if kind == 'study':
-                study_block_counter += 1
-                if study_block_counter % long_break_every == 0:
-                    l_end = cur + timedelta(minutes=long_break_len)
-                    rows.append({
-                        "start": cur.strftime("%H:%M"),
-                        "end": l_end.strftime("%H:%M"),
-                        "duration_min": long_break_len,
-                        "type": "break",
-                        "subject": ""
-                    })
-                    cur = l_end
-    return pd.DataFrame(rows)
+    for subj_idx, subj in enumerate(subjects):
+        remaining = per_subject[subj]
+        while remaining > 0:
+            if remaining <= focus_len:
+                dur = remaining
+                remaining = 0
+            else:
+                dur = focus_len
+                remaining -= focus_len
+            buf[n] = (cur_min, cur_min + dur, dur, 0, subj_idx)
+            cur_min += dur
+            n += 1
+            study_block_counter += 1
+            if study_block_counter % long_break_every == 0:
+                buf[n] = (cur_min, cur_min + long_break_len, long_break_len, 1, subj_idx)
+                cur_min += long_break_len
+                n += 1
+            if remaining > 0:
+                b = min(short_break, remaining)
+                buf[n] = (cur_min, cur_min + b, b, 1, subj_idx)
+                cur_min += b
+                remaining -= b
+                n += 1
+    kinds = ('study', 'break')
+    return [{
+        "start": f"{s // 60 % 24:02d}:{s % 60:02d}",
+        "end": f"{e // 60 % 24:02d}:{e % 60:02d}",
+        "duration_min": d,
+        "type": kinds[k],
+        "subject": subjects[si] if k == 0 else ""
+    } for s, e, d, k, si in buf[:n].tolist()]
 
 def pick_quote() -> str:
-    return random.choice(QUOTES)
+    return QUOTES[_RNG.randrange(_QUOTE_N)]
 
 @cl.on_chat_start
 async def start():
@@ -141,22 +200,15 @@ async def wizard() -> dict:
     await cl.Message(content="List your subjects and priorities like `Math:3, Python:2, AI:4` (higher = more time).").send()
     subjects_event = await cl.AskUserMessage(content="Subjects & priorities:", timeout=600).send()
     sp_text = (subjects_event and subjects_event["content"] or "").strip()
-    pairs = [p.strip() for p in sp_text.split(",") if p.strip()]
     subjects, priorities = [], {}
-    for p in pairs:
-        if ":" in p:
-            name, val = p.split(":", 1)
-            name = name.strip()
-            try:
-                pr = float(val.strip())
-            except ValueError:
-                pr = 1.0
-            subjects.append(name)
-            priorities[name] = pr
-        else:
-            name = p.strip()
-            subjects.append(name)
-            priorities[name] = 1.0
+    for m in _PAIR_RE.finditer(sp_text):
+        name, val = m.group(1), m.group(2)
+        try:
+            pr = float(val) if val else 1.0
+        except ValueError:
+            pr = 1.0
+        subjects.append(name)
+        priorities[name] = pr
     if not subjects:
         subjects = ["Math", "Python", "AI"]
         priorities = {"Math": 3, "Python": 2, "AI": 4}
@@ -182,10 +234,9 @@ async def wizard() -> dict:
 
     return {"subjects": subjects, "priorities": priorities, "total_minutes": total_minutes, "start_dt": start_dt}
 
-def df_to_markdown(df: pd.DataFrame) -> str:
+def df_to_markdown(rows: List[dict]) -> str:
     lines = ["| Start | End | Min | Type | Subject |", "|---|---:|---:|---|---|"]
-    for _, r in df.iterrows():
-        lines.append(f"| {r['start']} | {r['end']} | {int(r['duration_min'])} | {r['type']} | {r['subject']} |")
+    lines.extend(f"| {r['start']} | {r['end']} | {int(r['duration_min'])} | {r['type']} | {r['subject']} |" for r in rows)
     return "\n".join(lines)
 
 @cl.on_message
@@ -195,40 +246,42 @@ async def handle_message(message: str):
     if text == "example":
         subjects = ["Math", "Python", "AI"]
         priorities = {"Math": 3, "Python": 2, "AI": 4}
-        df = build_schedule(subjects, priorities, 180)
-        save_last_plan(df)
-        md = df_to_markdown(df)
+        rows = build_schedule(subjects, priorities, 180)
+        save_last_plan(rows)
+        md = df_to_markdown(rows)
         await cl.Message(content=f"🗓 **Example Plan (3h)**\n\n{md}\n\n**Quote:** _{pick_quote()}_").send()
         return
 
     if text == "last":
-        df = load_last_plan()
-        if df.empty:
+        rows = load_last_plan()
+        if not rows:
             await cl.Message(content="No saved plan yet. Type `plan` to create one.").send()
             return
-        md = df_to_markdown(df)
+        md = df_to_markdown(rows)
         await cl.Message(content=f"🗂 **Last Saved Plan**\n\n{md}").send()
         return
 
     if text == "save":
-        df = load_last_plan()
-        if df.empty:
+        rows = load_last_plan()
+        if not rows:
             await cl.Message(content="Nothing to save yet. Create a plan first (`plan`).").send()
             return
-        save_last_plan(df)
+        save_last_plan(rows)
         await cl.Message(content="💾 Plan saved.").send()
         return
 
     if text == "reset":
-        save_memory({"last_plan": []})
+        global _MEM_CACHE
+        MEMORY_PATH.unlink(missing_ok=True)
+        _MEM_CACHE = None
         await cl.Message(content="🧹 Cleared saved plan.").send()
         return
 
     if text == "plan":
         params = await wizard()
-        df = build_schedule(params["subjects"], params["priorities"], params["total_minutes"], start_time=params["start_dt"])
-        save_last_plan(df)
-        md = df_to_markdown(df)
+        rows = build_schedule(params["subjects"], params["priorities"], params["total_minutes"], start_time=params["start_dt"])
+        save_last_plan(rows)
+        md = df_to_markdown(rows)
         await cl.Message(content=f"🗓 **Your Study Plan**\n\n{md}\n\n**Quote:** _{pick_quote()}_").send()
         return
 